@@ -21,46 +21,42 @@ It performs the following functions:
    preparations are scheduled per day and that buffers and medias
    are not prepared on the same day.
 
-5. Load Task Expirations from Excel:
-   - The `load_task_expirations_from_excel` function reads an
-   Excel file to load task expiration times into a dictionary, 
-   where each task is associated with a timedelta object
-   representing its expiration period.
-
-6. Load Task Dates from Excel:
+5. Load Task Dates from Excel:
    - The `load_task_dates_from_excel` function reads an Excel
    file to load the start dates of tasks into a dictionary.
 
-7. Load Preparations from Excel:
+6. Load Preparations from Excel:
    - The `load_excel_into_dict` function reads an Excel file
    to load preparation details (preparation name and volume)
    into a dictionary organized by task names.
 
-8. Load Preparation Details from Excel:
+7. Load Preparation Details from Excel:
    - The `load_prep_details_from_excel` function reads an Excel
    file to load preparation details, including type
    (Media or Buffer) and expiration time, into a dictionary.
 
-9. Optimize Schedule:
+8. Optimize Schedule:
    - The `optimize_schedule` function generates an initial
-   schedule by considering task start dates, preparation details,
-   and product expiration times. It ensures that preparations
+   schedule by considering task start dates and preparation details,
+   including their expiration times. It ensures that preparations
    are scheduled within their valid periods and that volume
-   constraints are respected.
+   constraints are respected. Preparations with the tightest
+   expiration are scheduled first.
 
-10. Consolidate Preparations:
-    - The `consolidate_preps` function further optimizes the
-    schedule by consolidating preparations to minimize the
-    number of days used while adhering to constraints on the
-    maximum number of preparations and volume per day.
+9. Consolidate Preparations:
+   - The `consolidate_preps` function further optimizes the
+   schedule by consolidating preparations to minimize the
+   number of days used while adhering to constraints on the
+   maximum number of preparations and volume per day.
 
-11. Consolidate Preparations with Constraints:
+10. Consolidate Preparations with Constraints:
     - The `consolidate_preps_with_constraints` function refines
     the consolidation process by considering additional constraints
     to ensure the schedule is feasible.
 
-12. Main Execution:
-    - The `Main` function loads data from Excel files,
+11. Main Execution:
+    - The `Main` function loads data from Excel files
+    (opening the workbook once with `open_workbook`),
     optimizes the schedule, consolidates the preparations,
     and prints the final schedule. It combines tasks and
     preparations into a calendar format for easy visualization.
@@ -68,13 +64,28 @@ It performs the following functions:
 This process ensures that biologic preparations and tasks
 are scheduled efficiently, adhering to volume constraints
 and minimizing the number of preparation days,
-while respecting product expiration dates.
+while respecting preparation expiration dates.
 """
-from datetime import datetime, timedelta
-from typing import List, Tuple, Dict
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Tuple, Dict, Union
+import numpy as np
 import pandas as pd
+from python_calamine import CalamineWorkbook
+from sortedcontainers import SortedDict
 # pylint: disable=line-too-long
 
+DEFAULT_PATH = r'C:\Users\kgfj640\Documents\GPFN\GPFN_Scheduling.xlsm'  # Used when no path is given on the command line
+# Schedules with fewer batches run `_assign_batch_days` as plain Python: below this size, importing Numba and loading
+# the compiled kernel takes longer than the kernel itself
+NUMBA_MIN_BATCHES = 200_000
+MAX_PREPS_PER_DAY = 2  # Maximum number of preparations made on the same day
+# Days to go back from each weekday (Monday is 0): Monday and Tuesday go back to the previous Friday, other days go back two days
+PREVIOUS_WEEKDAY_OFFSETS = (3, 4, 2, 2, 2, 2, 2)
+
+@lru_cache(maxsize=4096)
 def get_previous_weekday(given_date: datetime.date) -> datetime.date:
     """
     Adjusts the given date to a previous weekday
@@ -88,12 +99,8 @@ def get_previous_weekday(given_date: datetime.date) -> datetime.date:
     date: The previous weekday date.
     """
 
-    weekday = given_date.weekday()  # Monday is 0, Sunday is 6
-    if weekday == 0:  # If it's Monday
-        return given_date - timedelta(days=3)  # Go back to the previous Friday
-    if weekday == 1: # If it's Tuesday
-        return given_date - timedelta(days=4) # Go back to the previous Friday
-    return given_date - timedelta(days=2)
+    # Index the offset table by weekday (Monday is 0, Sunday is 6)
+    return given_date - timedelta(days=PREVIOUS_WEEKDAY_OFFSETS[given_date.weekday()])
 
 def distribute_volume(prep: str, total_volume: int) -> List[Tuple[str, int]]:
     """
@@ -110,17 +117,15 @@ def distribute_volume(prep: str, total_volume: int) -> List[Tuple[str, int]]:
                     Each batch will have a volume of 500L or less.
     """
 
-    batches = []
     max_volume = 500  # Maximum volume for a single batch
+    if total_volume <= 0:
+        return []
 
-    # Distribute the total volume into batches
-    while total_volume > 0:
-        if total_volume >= max_volume:
-            batches.append((prep, max_volume))
-            total_volume -= max_volume
-        else:
-            batches.append((prep, total_volume))
-            total_volume = 0
+    # Full batches of the maximum volume, followed by whatever is left over
+    full_batches, remainder = divmod(total_volume, max_volume)
+    batches = [(prep, max_volume)] * full_batches
+    if remainder:
+        batches.append((prep, remainder))
 
     return batches
 
@@ -136,16 +141,22 @@ def get_working_days(start_date: datetime.date, end_date: datetime.date) -> List
     List[date]: A list of dates representing the working days within the specified range.
     """
 
-    # Calculate the total number of days between start_date and end_date
-    total_days = (end_date - start_date).days + 1
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)  # Empty if start_date is after end_date
+    return days[_working_day_mask(days)].tolist()
 
-    # Generate a list of all dates in the range
-    all_dates = [start_date + timedelta(days=x) for x in range(total_days)]
+def _working_day_mask(days: np.ndarray) -> np.ndarray:
+    """
+    Flags the working days (Monday to Friday) in an array of days.
+    Used by `get_working_days` and by `optimize_schedule` for the working days passed to `_assign_batch_days`.
 
-    # Filter out only the weekdays (Monday to Friday)
-    weekday_dates = [date for date in all_dates if date.weekday() < 5]
+    Parameters:
+    days (np.ndarray): The days to check, as datetime64[D] values.
+
+    Returns:
+    np.ndarray: A boolean array that is True for the working days.
+    """
 
-    return weekday_dates
+    return np.is_busday(days)
 
 def find_available_days(schedule: Dict[datetime.date, List[Tuple[str, int]]], current_type: str, date_list: List[datetime.date], prep_details: Dict[str, Dict[str, str]]) -> List[datetime.date]:
     """
@@ -167,75 +178,131 @@ def find_available_days(schedule: Dict[datetime.date, List[Tuple[str, int]]], cu
     for day in date_list:
         if day not in schedule:
             available_days.append(day)  # Add the day if nothing is scheduled yet
-        elif len(schedule[day]) < 2:
+        elif len(schedule[day]) < MAX_PREPS_PER_DAY:
             # Check if all preps scheduled on this day are of the same type as the current prep type
             if all(prep_details[prep]['type'] == current_type for prep, _ in schedule[day]):
                 available_days.append(day)
     return available_days
 
-def load_task_expirations_from_excel(filepath: str, sheet_name: str) -> Dict[str, timedelta]:
+def open_workbook(filepath: str) -> CalamineWorkbook:
     """
-    Loads task expiration information from an Excel file and returns it as a dictionary.
+    Opens an Excel file once so that several sheets can be read from it.
 
     Parameters:
     filepath (str): The path to the Excel file.
-    sheet_name (str): The name of the sheet containing the task expiration data.
 
     Returns:
-    Dict[str, timedelta]: A dictionary where keys are task names and values are expiration times as timedelta objects.
+    CalamineWorkbook: The opened workbook.
+    """
+
+    return CalamineWorkbook.from_path(filepath)
+
+def _column_indices(usecols: str) -> List[int]:
+    """
+    Converts an Excel column selection into zero-based column indices, in sheet order.
+
+    Parameters:
+    usecols (str): Comma separated Excel columns and column ranges (e.g., "A:E" or "G,C,H").
+
+    Returns:
+    List[int]: The selected column indices (A is 0), sorted.
+    """
+
+    def letter_index(letters: str) -> int:
+        index = 0
+        for letter in letters.strip().upper():
+            index = index * 26 + ord(letter) - ord('A') + 1
+        return index - 1
+
+    indices = set()
+    for part in usecols.split(','):
+        first, _, last = part.partition(':')
+        indices.update(range(letter_index(first), letter_index(last or first) + 1))
+    return sorted(indices)
+
+def _read_sheet(filepath: Union[str, CalamineWorkbook], sheet_name: str, usecols: str, skiprows: int, columns: List[str]) -> List[Tuple[object, ...]]:
+    """
+    Reads the named columns of an Excel sheet, skipping the rows where any of them is empty.
+
+    Parameters:
+    filepath (Union[str, CalamineWorkbook]): The path to the Excel file, or a workbook opened with `open_workbook`.
+    sheet_name (str): The name of the sheet to read.
+    usecols (str): The Excel columns holding the data (e.g., "A:E").
+    skiprows (int): The number of rows to skip before the header row.
+    columns (List[str]): The header names of the columns to return.
+
+    Returns:
+    List[Tuple[object, ...]]: One tuple of cell values per data row, in the order of `columns`.
     """
 
-    df = pd.read_excel(filepath, sheet_name=sheet_name, usecols="G,I", skiprows=1)
-    df = df.dropna(subset=['Process', 'Hold Time'])
-    # Rename columns for clarity
-    df.columns = ['Task', 'Expiration']
+    if isinstance(filepath, CalamineWorkbook):
+        rows = filepath.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+    else:
+        with open_workbook(filepath) as workbook:
+            rows = workbook.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+    if len(rows) <= skiprows:
+        return []
+
+    # Find the requested columns by their header, looking only at the selected Excel columns (the first one wins on duplicates)
+    header = rows[skiprows]
+    selected = {}
+    for index in _column_indices(usecols):
+        if index < len(header):
+            selected.setdefault(header[index], index)
+    positions = [selected[name] for name in columns]
+
+    data = []
+    for row in rows[skiprows + 1:]:
+        # Numbers are read as floats; turn integral ones back into ints like pandas does (e.g., numeric names)
+        values = tuple(int(row[index]) if isinstance(row[index], float) and row[index].is_integer() else row[index] for index in positions)
+        # Empty cells are read as empty strings
+        if all(value not in ('', None) for value in values):
+            data.append(values)
+    return data
+
+def _to_date(value: object) -> datetime.date:
+    """
+    Converts an Excel cell value to a date.
+
+    Parameters:
+    value (object): The cell value, usually already a date or datetime, otherwise text such as '5/1/2023'.
 
-    # Create the dictionary for task expirations
-    task_expirations = {}
-    for _, row in df.iterrows():
-        task = row['Task']
-        # Convert expiration time to timedelta object
-        expiration_time = timedelta(days=int(row['Expiration']))
-        # Add the task expiration time to the dictionary
-        task_expirations[task] = expiration_time
+    Returns:
+    date: The date of the cell.
+    """
 
-    return task_expirations
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
 
-def load_task_dates_from_excel(filepath: str, sheet_name: str) -> Dict[str, datetime.date]:
+def load_task_dates_from_excel(filepath: Union[str, CalamineWorkbook], sheet_name: str) -> Dict[str, datetime.date]:
     """
     Loads task start dates from an Excel file and returns them as a dictionary.
 
     Parameters:
-    filepath (str): The path to the Excel file.
+    filepath (Union[str, CalamineWorkbook]): The path to the Excel file, or a workbook opened with `open_workbook`.
     sheet_name (str): The name of the sheet containing the task start date data.
 
     Returns:
     Dict[str, datetime.date]: A dictionary where keys are task names and values are start dates.
     """
 
-    df = pd.read_excel(filepath, sheet_name=sheet_name, usecols="N,O", skiprows=1)
-    df = df.dropna(subset=['Task', 'Start Date'])
-    # Rename columns for clarity
-    df.columns = ['Task', 'Start Date']
+    rows = _read_sheet(filepath, sheet_name, usecols="N,O", skiprows=1, columns=['Task', 'Start Date'])
 
     # Create the dictionary for task start dates
-    task_dates = {}
-    for _, row in df.iterrows():
-        task = row['Task']
-        # Convert date to datetime object if not already
-        start_date = pd.to_datetime(row['Start Date']).date()
-        # Add the task start date to the dictionary
-        task_dates[task] = start_date
+    task_dates = {task: _to_date(start_date) for task, start_date in rows}
 
     return task_dates
 
 
-def load_excel_into_dict(filepath: str, sheet_name: str) -> Dict[str, List[Tuple[str, int]]]:
+def load_excel_into_dict(filepath: Union[str, CalamineWorkbook], sheet_name: str) -> Dict[str, List[Tuple[str, int]]]:
     """
     Loads task details from an Excel file and returns them as a dictionary.
 
     Parameters:
-    filepath (str): The path to the Excel file.
+    filepath (Union[str, CalamineWorkbook]): The path to the Excel file, or a workbook opened with `open_workbook`.
     sheet_name (str): The name of the sheet containing the task data.
 
     Returns:
@@ -244,56 +311,114 @@ def load_excel_into_dict(filepath: str, sheet_name: str) -> Dict[str, List[Tuple
     preparation names and volumes.
     """
 
-    df = pd.read_excel(filepath, sheet_name=sheet_name, usecols="A:E", skiprows=1)
-    df = df.dropna(subset=['Task', 'Prep', 'Volume (L)'])
+    rows = _read_sheet(filepath, sheet_name, usecols="A:E", skiprows=1, columns=['Task', 'Prep', 'Volume (L)'])
 
-    # Create the dictionary
-    tasks_dict = {}
-    for _, row in df.iterrows():
-        task = row['Task']
-        prep_name = row['Prep']
-        volume = int(row['Volume (L)'])
+    if not rows:
+        return {}
 
-        # Add the prep details to the corresponding task in the dictionary
-        if task not in tasks_dict:
-            tasks_dict[task] = []
+    # Convert the whole volume column to integers at once
+    task_names, prep_names, volumes = zip(*rows)
+    volumes = np.asarray(volumes, dtype=np.float64).astype(np.int64).tolist()
+
+    # Collect the prep details per task (keeping the sheet order)
+    tasks_dict = defaultdict(list)
+    for task, prep_name, volume in zip(task_names, prep_names, volumes):
         tasks_dict[task].append((prep_name, volume))
 
-    return tasks_dict
+    return dict(tasks_dict)
 
-def load_prep_details_from_excel(filepath: str, sheet_name: str) -> Dict[str, Dict[str, object]]:
+def load_prep_details_from_excel(filepath: Union[str, CalamineWorkbook], sheet_name: str) -> Dict[str, Dict[str, object]]:
     """
     Loads preparation details from an Excel file and returns them as a dictionary.
 
     Parameters:
-    filepath (str): The path to the Excel file.
+    filepath (Union[str, CalamineWorkbook]): The path to the Excel file, or a workbook opened with `open_workbook`.
     sheet_name (str): The name of the sheet containing the preparation details.
 
     Returns:
     Dict[str, Dict[str, object]]: A dictionary where keys are preparation names and values are dictionaries containing the type and expiration time.
     """
 
-    df = pd.read_excel(filepath, sheet_name=sheet_name, usecols="G,C,H", skiprows=0)
-    df = df.dropna(subset=['PN Name', 'Expiration', 'Is Media?'])
+    rows = _read_sheet(filepath, sheet_name, usecols="G,C,H", skiprows=0, columns=['PN Name', 'Expiration', 'Is Media?'])
 
-    # Rename columns for clarity
-    df.columns = ['Expiration', 'Preps', 'Is Media?']
+    if not rows:
+        return {}
 
-    # Create the dictionary for prep details
-    prep_details = {}
-    for _, row in df.iterrows():
-        prep_name = row['Preps']
-        expiration = timedelta(days=int(row['Expiration']))
-        type_ = "Media" if row['Is Media?'] == 'Y' else "Buffer"
+    # Convert the whole expiration column (in days) to timedelta objects at once
+    prep_names, expirations, is_media = zip(*rows)
+    expirations = np.asarray(expirations, dtype=np.float64).astype(np.int64).astype('timedelta64[D]').tolist()
 
-        # Add the prep details to the dictionary
-        prep_details[prep_name] = {"type": type_, "Expiration": expiration}
+    # Create the dictionary for prep details
+    prep_details = {prep_name: {"type": "Media" if media == 'Y' else "Buffer", "Expiration": expiration}
+                    for prep_name, expiration, media in zip(prep_names, expirations, is_media)}
 
     return prep_details
 
-def optimize_schedule(task_dates: Dict[str, datetime.date], tasks: Dict[str, List[Tuple[str, int]]], prep_details: Dict[str, Dict[str, object]], product_expirations: Dict[str, timedelta]) -> Dict[datetime.date, List[Tuple[str, int]]]:
+def _assign_batch_days(window_starts: np.ndarray, window_ends: np.ndarray, type_ids: np.ndarray, batch_counts: np.ndarray, first_day: int, working_days: np.ndarray) -> np.ndarray:
+    """
+    Assigns a production day to every batch, working on ordinal dates so that it can be compiled with Numba
+    (see `_compiled_assign_batch_days`).
+
+    Each requirement (one prep of one task) has a window of ordinal days and a number of batches. Its batches are
+    placed on the latest available working days of the window, where a day is available if it has fewer than
+    MAX_PREPS_PER_DAY preps, all of the same type. This is the scheduler's implementation of the rules described
+    by `get_working_days` and `find_available_days`.
+
+    Parameters:
+    window_starts (np.ndarray): The first ordinal day each requirement can be produced on.
+    window_ends (np.ndarray): The last ordinal day each requirement can be produced on.
+    type_ids (np.ndarray): The integer code of each requirement's prep type.
+    batch_counts (np.ndarray): The number of batches of each requirement.
+    first_day (int): The earliest ordinal day of all windows.
+    working_days (np.ndarray): Flags the working days from first_day to the latest day of all windows (see `_working_day_mask`).
+
+    Returns:
+    np.ndarray: The ordinal day of every batch, in requirement order, or -1 if no day was available.
+    """
+
+    # Per-day counters, indexed by the ordinal day minus first_day
+    day_count = np.zeros(working_days.shape[0], dtype=np.int64)
+    day_type = np.full(working_days.shape[0], -1, dtype=np.int64)
+    batch_days = np.full(batch_counts.sum(), -1, dtype=np.int64)
+
+    batch = 0
+    for requirement in range(window_starts.shape[0]):
+        current_type = type_ids[requirement]
+        day = window_ends[requirement]
+        for _ in range(batch_counts[requirement]):
+            # Sweep back from the latest day, skipping non-working days and days that are unavailable
+            while day >= window_starts[requirement] and (
+                    not working_days[day - first_day]
+                    or day_count[day - first_day] >= MAX_PREPS_PER_DAY
+                    or day_type[day - first_day] not in (-1, current_type)):
+                day -= 1
+            if day >= window_starts[requirement]:
+                batch_days[batch] = day
+                day_count[day - first_day] += 1
+                day_type[day - first_day] = current_type
+                day -= 1
+            batch += 1
+
+    return batch_days
+
+@lru_cache(maxsize=None)
+def _compiled_assign_batch_days():
+    """
+    Compiles `_assign_batch_days` with Numba, reusing the compiled code saved by earlier runs.
+
+    Returns:
+    The compiled kernel, or None if Numba is not installed.
+    """
+
+    try:
+        from numba import njit  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return njit(cache=True)(_assign_batch_days)
+
+def optimize_schedule(task_dates: Dict[str, datetime.date], tasks: Dict[str, List[Tuple[str, int]]], prep_details: Dict[str, Dict[str, object]]) -> Dict[datetime.date, List[Tuple[str, int]]]:
     """
-    Optimizes the schedule for tasks based on their dates, preparation details, and product expiration times.
+    Optimizes the schedule for tasks based on their dates and preparation details.
 
     Parameters:
     task_dates (Dict[str, datetime.date]): A dictionary where keys are task names and values are their start dates.
@@ -303,41 +428,54 @@ def optimize_schedule(task_dates: Dict[str, datetime.date], tasks: Dict[str, Lis
     dictionaries 
     containing the type and expiration 
     time.
-    product_expirations (Dict[str, timedelta]): A dictionary where keys are task names and values are the product 
-    expiration 
-    times as timedelta objects.
 
     Returns:
     Dict[date, List[Tuple[str, int]]]: A dictionary where keys are dates and values are lists of tuples containing 
     preparation names and volumes scheduled for 
     those dates.
     """
+    # Flatten the requirements into integer arrays: ordinal date windows, prep type codes and batch counts
+    type_ids = {}
+    prep_type_id = {prep: type_ids.setdefault(details['type'], len(type_ids)) for prep, details in prep_details.items()}
+    # Schedule the preps with the tightest expiration first (then the earliest tasks), as they have the fewest candidate days
+    requirements = [(task_date, prep, volume, prep_details[prep]['Expiration'])
+                    for task, task_date in task_dates.items() for prep, volume in tasks.get(task, [])]
+    requirements.sort(key=lambda requirement: (requirement[3], requirement[0]))
+
+    requirement_batches = []
+    window_starts = []
+    window_ends = []
+    requirement_types = []
+    for task_date, prep, volume, expiration_delta in requirements:
+        requirement_batches.append(distribute_volume(prep, volume))
+        # The window starts at the task_date minus the prep's expiration period, and ends one or two days before the task
+        window_starts.append((task_date - expiration_delta).toordinal())
+        window_ends.append(get_previous_weekday(task_date).toordinal())
+        requirement_types.append(prep_type_id[prep])
+
+    if not requirement_batches:
+        return {}
+    first_day = min(min(window_starts), min(window_ends))
+    all_days = np.datetime64(date.fromordinal(first_day), 'D') + np.arange(max(window_ends) - first_day + 1)
+    batch_counts = np.array([len(batches) for batches in requirement_batches], dtype=np.int64)
+
+    # Only large schedules are worth compiling the kernel for
+    assign_batch_days = _assign_batch_days
+    if batch_counts.sum() >= NUMBA_MIN_BATCHES:
+        assign_batch_days = _compiled_assign_batch_days() or _assign_batch_days
+    batch_days = assign_batch_days(np.array(window_starts, dtype=np.int64),
+                                   np.array(window_ends, dtype=np.int64),
+                                   np.array(requirement_types, dtype=np.int64),
+                                   batch_counts, first_day, _working_day_mask(all_days))
+
+    # Convert the assigned ordinal days back into the schedule dictionary
     schedule = {}
-    for task, task_date in task_dates.items():
-        requirements = tasks.get(task, [])
-        #product_expiration_date = task_date + product_expirations[task]
-        for prep, volume in requirements:
-            prep_type = prep_details[prep]['type']
-            expiration_delta = prep_details[prep]['Expiration']
-
-            # Set latest date as one or two days before the task
-            end_date = get_previous_weekday(task_date)
-            # Calculate start_date as the task_date minus the prep's expiration period
-            start_date = task_date - expiration_delta  # Ensure start_date is not in the past
-
-            batches = distribute_volume(prep, volume)
-            working_days = get_working_days(start_date, end_date)
-            available_days = find_available_days(schedule, prep_type, working_days, prep_details)
-
-            for batch in batches:
-                if not available_days:
-                    print(f"No available days for {prep} with batch size {batch[1]}")
-                    continue
-                # Schedule the batch on the last available day to allow maximum flexibility
-                prod_day = available_days.pop()
-                if not schedule.get(prod_day):
-                    schedule[prod_day] = []
-                schedule[prod_day].append((prep, batch[1]))
+    all_batches = (batch for batches in requirement_batches for batch in batches)
+    for (prep, batch_volume), prod_day in zip(all_batches, batch_days.tolist()):
+        if prod_day < 0:
+            print(f"No available days for {prep} with batch size {batch_volume}")
+            continue
+        schedule.setdefault(date.fromordinal(prod_day), []).append((prep, batch_volume))
 
     return schedule
 
@@ -358,33 +496,42 @@ def consolidate_preps(schedule: Dict[datetime.date, List[Tuple[str, int]]], prep
     Dict[date, List[Tuple[str, int]]]: An optimized schedule with consolidated preparations.
     """
 
-    all_preps = {}
-    for day, preps in schedule.items():
-        for prep, volume in preps:
-            if prep not in all_preps:
-                all_preps[prep] = {'total_volume': 0, 'type': prep_details[prep]['type'], 'earliest_day': day}
-            all_preps[prep]['total_volume'] += volume
-            if day < all_preps[prep]['earliest_day']:
-                all_preps[prep]['earliest_day'] = day
+    # Lay the schedule out as parallel arrays, one entry per scheduled batch
+    entries = [(day, prep, volume) for day, preps in schedule.items() for prep, volume in preps]
+    if not entries:
+        return {}
+    entry_days, entry_preps, entry_volumes = zip(*entries)
+    days = np.array(entry_days, dtype='datetime64[D]')
+    volumes = np.array(entry_volumes, dtype=np.int64)
+
+    # Group the entries by prep (numbered in the order they first appear) and reduce each group
+    prep_codes, prep_names = pd.factorize(np.array(entry_preps, dtype=object))
+    order = np.argsort(prep_codes, kind='stable')
+    group_starts = np.flatnonzero(np.diff(prep_codes[order], prepend=-1))
+    earliest_days = np.minimum.reduceat(days[order], group_starts)
+    total_volumes = np.add.reduceat(volumes[order], group_starts)
 
     # Create a new schedule, trying to fit preps into as few days as possible
     optimized_schedule = {}
-    for prep, details in all_preps.items():
-        volume_remaining = details['total_volume']
-        earliest_possible_day = details['earliest_day']
+    # Running per-day counters, so that a day's preps are not rescanned on every check
+    day_type_volume = defaultdict(lambda: defaultdict(int))
+    day_prep_count = defaultdict(int)
+    for prep, volume_remaining, earliest_possible_day in zip(prep_names, total_volumes.tolist(), earliest_days.tolist()):
+        prep_type = prep_details[prep]['type']
         day = earliest_possible_day
 
         while volume_remaining > 0:
-            if day not in optimized_schedule:
-                optimized_schedule[day] = []
+            day_preps = optimized_schedule.setdefault(day, [])
 
             # Calculate the available volume for this day
-            current_volume_on_day = sum(v for p, v in optimized_schedule[day] if prep_details[p]['type'] == details['type'])
+            current_volume_on_day = day_type_volume[day][prep_type]
             available_volume = max_volume_per_day - current_volume_on_day
 
-            if len(optimized_schedule[day]) < max_preps_per_day and available_volume > 0:
+            if day_prep_count[day] < max_preps_per_day and available_volume > 0:
                 volume_to_add = min(volume_remaining, available_volume)
-                optimized_schedule[day].append((prep, volume_to_add))
+                day_preps.append((prep, volume_to_add))
+                day_type_volume[day][prep_type] += volume_to_add
+                day_prep_count[day] += 1
                 volume_remaining -= volume_to_add
 
             # Move to the next day if there's still volume remaining
@@ -418,34 +565,43 @@ def consolidate_preps_with_constraints(schedule: Dict[datetime.date, List[Tuple[
     for day in sorted_days:
         preps = schedule[day]
         for prep, volume in preps:
-            if prep not in temp_storage:
-                temp_storage[prep] = {'volume': 0, 'earliest_day': day, 'type': prep_details[prep]['type']}
+            stored = temp_storage.get(prep)
+            if stored is None:
+                stored = temp_storage[prep] = {'volume': 0, 'earliest_day': day, 'type': prep_details[prep]['type']}
 
             # Update total volume and reset earliest day if this entry is earlier
-            temp_storage[prep]['volume'] += volume
-            if day < temp_storage[prep]['earliest_day']:
-                temp_storage[prep]['earliest_day'] = day
+            stored['volume'] += volume
+            if day < stored['earliest_day']:
+                stored['earliest_day'] = day
+
+    # Running per-day counters, so that a day's preps are not rescanned on every check
+    day_type_volume = defaultdict(lambda: defaultdict(int))
+    day_prep_count = defaultdict(int)
 
     # Attempt to place each prep on its earliest possible day or combine when possible
     for prep, details in temp_storage.items():
+        current_type = details['type']
         day = details['earliest_day']
         volume_remaining = details['volume']
 
         while volume_remaining > 0:
-            if day not in optimized_schedule:
-                optimized_schedule[day] = []
+            day_preps = optimized_schedule.setdefault(day, [])
 
             # Check if we can add to this day
-            current_volume = sum(v for p, v in optimized_schedule[day] if prep_details[p]['type'] == details['type'])
-            if len(optimized_schedule[day]) < max_preps_per_day and current_volume + volume_remaining <= max_volume_per_day:
-                optimized_schedule[day].append((prep, volume_remaining))
+            current_volume = day_type_volume[day][current_type]
+            if day_prep_count[day] < max_preps_per_day and current_volume + volume_remaining <= max_volume_per_day:
+                day_preps.append((prep, volume_remaining))
+                day_type_volume[day][current_type] += volume_remaining
+                day_prep_count[day] += 1
                 break  # Break because we've placed all the remaining volume
             else:
                 # Find the next possible day to place the remaining volume
                 available_volume = min(max_volume_per_day - current_volume, volume_remaining)
 
-                if available_volume > 0 and len(optimized_schedule[day]) < max_preps_per_day:
-                    optimized_schedule[day].append((prep, available_volume))
+                if available_volume > 0 and day_prep_count[day] < max_preps_per_day:
+                    day_preps.append((prep, available_volume))
+                    day_type_volume[day][current_type] += available_volume
+                    day_prep_count[day] += 1
                     volume_remaining -= available_volume
 
                 # Move to the next day
@@ -458,12 +614,13 @@ def main(filepath):
     """
     Runs the whole process
     """
-    prep_details = load_prep_details_from_excel(filepath, 'Prep DB')
-    product_expirations = load_task_expirations_from_excel(filepath,'Main')
-    tasks = load_excel_into_dict(filepath, 'Preps to Use')
-    task_dates = load_task_dates_from_excel(filepath, 'Main')
-    print('task dates',task_dates,'tasks',tasks,'prepdetails',prep_details,'prodexp',product_expirations)
-    final_schedule = optimize_schedule(task_dates, tasks, prep_details, product_expirations)
+    # Open the workbook once and read every sheet from the same handle
+    with open_workbook(filepath) as workbook:
+        prep_details = load_prep_details_from_excel(workbook, 'Prep DB')
+        tasks = load_excel_into_dict(workbook, 'Preps to Use')
+        task_dates = load_task_dates_from_excel(workbook, 'Main')
+    print('task dates',task_dates,'tasks',tasks,'prepdetails',prep_details)
+    final_schedule = optimize_schedule(task_dates, tasks, prep_details)
 
     # Combine tasks and preps in one calendar
     consolidated_schedule = consolidate_preps(final_schedule, prep_details)
@@ -471,19 +628,23 @@ def main(filepath):
 
     print(consolidated_schedule_new)
 
-    calendar_entries = {}
-    for date, preps in consolidated_schedule_new.items():
-        date_key = date
+    # Keep the calendar ordered by date as it is built
+    calendar_entries = SortedDict()
+    for day, preps in consolidated_schedule_new.items():
+        date_key = day
         calendar_entries.setdefault(date_key, []).extend(
             f"Prep: {prep} {volume}L ({prep_details[prep]['type']})" for prep, volume in preps)
 
-    for task, date in task_dates.items():
-        date_key = date
+    for task, task_date in task_dates.items():
+        date_key = task_date
         calendar_entries.setdefault(date_key, []).append(f"Task: {task}")
 
     # Print the calendar
-    for date in sorted(calendar_entries):
-        print(f"{date}:")
-        for entry in calendar_entries[date]:
+    for day, entries in calendar_entries.items():
+        print(f"{day}:")
+        for entry in entries:
             print(f"  - {entry}")
-main(filepath = r'C:\Users\kgfj640\Documents\GPFN\GPFN_Scheduling.xlsm')
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
+
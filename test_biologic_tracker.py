@@ -1,6 +1,12 @@
+import os
+import tempfile
 import unittest
-from datetime import datetime, date
-from biologic_tracker import get_previous_weekday, distribute_volume,get_working_days,find_available_days
+from datetime import datetime, date, timedelta
+import numpy as np
+import openpyxl
+from biologic_tracker import get_previous_weekday, distribute_volume,get_working_days,find_available_days,optimize_schedule,consolidate_preps
+from biologic_tracker import _assign_batch_days, _compiled_assign_batch_days
+from biologic_tracker import _column_indices, load_task_dates_from_excel, load_excel_into_dict, load_prep_details_from_excel, open_workbook
 
 class TestGetPreviousWeekday(unittest.TestCase):
     def test_monday(self):
@@ -29,6 +35,10 @@ class test_distribute_volume(unittest.TestCase):
         self.assertEqual(distribute_volume("prepA",100),[("prepA",100)])
     def test_change_volumes(self):
         self.assertEqual(distribute_volume("prepA",1300),[("prepA",500),("prepA",500),("prepA",300)])
+    def test_exact_multiple(self):
+        self.assertEqual(distribute_volume("prepA",1000),[("prepA",500),("prepA",500)])
+    def test_no_volume(self):
+        self.assertEqual(distribute_volume("prepA",0),[])
 
 class TestGetWorkingDays(unittest.TestCase):
     def test_entire_week(self):
@@ -70,6 +80,7 @@ class TestFindAvailableDays(unittest.TestCase):
     4. D1[M] D2[B] D3[]   | M -> D1 and D3 open
     5. D1[M] D2[B] D3[]   | B -> D2 and D3 open
     6. D1[M,M] D2[B,B] D3[M,M] | M -> None open
+    7. D1[M] D2[] | M -> D1 and D2 open, preps on days outside the list are not looked up
     """
     
     
@@ -152,5 +163,163 @@ class TestFindAvailableDays(unittest.TestCase):
             find_available_days(schedule, 'buffer', date_list, prep_details),
             []
         )
+
+    def test_seven(self):
+        # Preps scheduled outside date_list are not looked up, even if they have no details
+        date_list = [date(2023, 5, 22), date(2023, 5, 23)]
+        prep_details = {'prepM1': {'type': 'media'}}
+        schedule = {
+            date(2023, 5, 22): [('prepM1', 100)],
+            date(2023, 5, 29): [('unknown', 100), ('unknown', 100)]
+        }
+
+        self.assertEqual(
+            find_available_days(schedule, 'media', date_list, prep_details),
+            [date(2023, 5, 22), date(2023, 5, 23)]
+        )
+
+class TestOptimizeSchedule(unittest.TestCase):
+    def test_separates_types_and_splits_batches(self):
+        prep_details = {'prepM1': {'type': 'media', 'Expiration': timedelta(days=7)},
+                        'prepB1': {'type': 'buffer', 'Expiration': timedelta(days=7)}}
+        task_dates = {'task1': date(2023, 5, 26)}  # Friday, so the last prep day is Wednesday
+        tasks = {'task1': [('prepM1', 700), ('prepB1', 200)]}
+
+        self.assertEqual(
+            optimize_schedule(task_dates, tasks, prep_details),
+            {date(2023, 5, 24): [('prepM1', 500)], date(2023, 5, 23): [('prepM1', 200)], date(2023, 5, 22): [('prepB1', 200)]}
+        )
+
+    def test_tightest_expiration_first(self):
+        # prepM1 only fits on the last two days, so it is placed before the buffers fill them
+        prep_details = {'prepB1': {'type': 'buffer', 'Expiration': timedelta(days=14)},
+                        'prepB2': {'type': 'buffer', 'Expiration': timedelta(days=14)},
+                        'prepM1': {'type': 'media', 'Expiration': timedelta(days=3)}}
+        task_dates = {'task1': date(2023, 5, 26)}
+        tasks = {'task1': [('prepB1', 1000), ('prepB2', 1000), ('prepM1', 500)]}
+
+        self.assertEqual(
+            optimize_schedule(task_dates, tasks, prep_details),
+            {date(2023, 5, 24): [('prepM1', 500)],
+             date(2023, 5, 23): [('prepB1', 500), ('prepB2', 500)],
+             date(2023, 5, 22): [('prepB1', 500), ('prepB2', 500)]}
+        )
+
+    @unittest.skipIf(_compiled_assign_batch_days() is None, "Numba is not installed")
+    def test_compiled_kernel_matches_python(self):
+        # Two media requirements and one buffer requirement over the working days of 2023-05-15 to 2023-05-26
+        args = ([738655, 738655, 738660], [738666, 738664, 738666], [0, 0, 1], [3, 2, 2])
+        args = tuple(np.array(values, dtype=np.int64) for values in args)
+        working_days = np.is_busday(np.datetime64('2023-05-15') + np.arange(12))
+
+        self.assertEqual(
+            _compiled_assign_batch_days()(*args, 738655, working_days).tolist(),
+            _assign_batch_days(*args, 738655, working_days).tolist()
+        )
+
+    def test_no_requirements(self):
+        self.assertEqual(optimize_schedule({'task1': date(2023, 5, 26)}, {}, {}), {})
+
+class TestConsolidatePreps(unittest.TestCase):
+    def test_combines_volumes_from_earliest_day(self):
+        prep_details = {'prepM1': {'type': 'media'}, 'prepB1': {'type': 'buffer'}}
+        schedule = {
+            date(2023, 5, 23): [('prepM1', 300)],
+            date(2023, 5, 22): [('prepM1', 300), ('prepB1', 100)]
+        }
+
+        self.assertEqual(
+            consolidate_preps(schedule, prep_details),
+            {date(2023, 5, 22): [('prepM1', 500), ('prepB1', 100)], date(2023, 5, 23): [('prepM1', 100)]}
+        )
+
+    def test_empty_schedule(self):
+        self.assertEqual(consolidate_preps({}, {}), {})
+
+class TestColumnIndices(unittest.TestCase):
+    def test_single_columns_in_sheet_order(self):
+        self.assertEqual(_column_indices("G,C,H"), [2, 6, 7])
+
+    def test_range(self):
+        self.assertEqual(_column_indices("A:E"), [0, 1, 2, 3, 4])
+
+    def test_double_letters(self):
+        self.assertEqual(_column_indices("Z:AB"), [25, 26, 27])
+
+class TestLoadFromExcel(unittest.TestCase):
+    """
+    Loads a small workbook laid out like the scheduling sheet, with blank rows
+    and rows missing a required cell, which must be skipped.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.TemporaryDirectory()
+        cls.filepath = os.path.join(cls.tempdir.name, 'schedule.xlsx')
+        workbook = openpyxl.Workbook()
+
+        sheet = workbook.active
+        sheet.title = 'Prep DB'
+        sheet.append(['ID', 'Description', 'Expiration', None, None, None, 'PN Name', 'Is Media?'])
+        sheet.append([1, 'media', 10, None, None, None, 'prepM1', 'Y'])
+        sheet.append([])
+        sheet.append([2, 'buffer', 14.0, None, None, None, 'prepB1', 'N'])
+        sheet.append([3, 'no expiration', None, None, None, None, 'prepX', 'Y'])
+        sheet.append([4, 'numeric name', 5, None, None, None, 42, 'N'])
+
+        sheet = workbook.create_sheet('Main')
+        sheet.append(['Schedule'])
+        sheet.append([None] * 13 + ['Task', 'Start Date'])
+        sheet.append([None] * 13 + ['Thaw', datetime(2023, 5, 22)])
+        sheet.append([])
+        sheet.append([None] * 13 + ['Harvest', datetime(2023, 6, 5, 8, 30)])
+        sheet.append([None] * 13 + ['No date', None])
+        sheet.append([None] * 13 + ['Seed', '5/1/2023'])
+        sheet.append([None] * 13 + [7, datetime(2023, 6, 12)])
+
+        sheet = workbook.create_sheet('Preps to Use')
+        sheet.append(['Preps'])
+        sheet.append(['Task', 'Prep', 'Volume (L)', 'Notes', 'Task'])
+        sheet.append(['Thaw', 'prepM1', 200, 'first', 'other'])
+        sheet.append(['Thaw', 'prepB1', 1200.0, None, 'other'])
+        sheet.append([])
+        sheet.append(['Harvest', 'prepM1', 700, None, None])
+        sheet.append(['Harvest', None, 300, None, None])
+        sheet.append([7, 42, 250, None, None])
+        workbook.save(cls.filepath)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tempdir.cleanup()
+
+    def test_task_dates(self):
+        self.assertEqual(
+            load_task_dates_from_excel(self.filepath, 'Main'),
+            {'Thaw': date(2023, 5, 22), 'Harvest': date(2023, 6, 5), 'Seed': date(2023, 5, 1), 7: date(2023, 6, 12)}
+        )
+        # Numeric task names are read as ints, not floats
+        self.assertIsInstance(list(load_task_dates_from_excel(self.filepath, 'Main'))[-1], int)
+
+    def test_tasks(self):
+        # The first 'Task' header is used, the second one in column E is ignored
+        tasks = load_excel_into_dict(self.filepath, 'Preps to Use')
+        self.assertEqual(tasks, {'Thaw': [('prepM1', 200), ('prepB1', 1200)], 'Harvest': [('prepM1', 700)], 7: [(42, 250)]})
+        self.assertIsInstance(tasks['Thaw'][0][1], int)
+        self.assertIsInstance(list(tasks)[-1], int)
+        self.assertIsInstance(tasks[7][0][0], int)
+
+    def test_prep_details(self):
+        self.assertEqual(
+            load_prep_details_from_excel(self.filepath, 'Prep DB'),
+            {'prepM1': {'type': 'Media', 'Expiration': timedelta(days=10)},
+             'prepB1': {'type': 'Buffer', 'Expiration': timedelta(days=14)},
+             42: {'type': 'Buffer', 'Expiration': timedelta(days=5)}}
+        )
+        self.assertIsInstance(list(load_prep_details_from_excel(self.filepath, 'Prep DB'))[-1], int)
+
+    def test_shared_workbook(self):
+        with open_workbook(self.filepath) as workbook:
+            self.assertEqual(load_task_dates_from_excel(workbook, 'Main'), load_task_dates_from_excel(self.filepath, 'Main'))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file